@@ -1,29 +1,136 @@
-import os, uuid, sqlite3
-from flask import Flask, render_template, request, jsonify, g, Response, make_response, redirect, url_for, session
+import os, io, csv, gzip, hmac, uuid, hashlib, atexit, sqlite3, threading, collections
+from flask import Flask, render_template, stream_template, request, jsonify, Response, make_response, redirect, url_for, session
+from flask_caching import Cache
+from typing import Optional
+from pydantic import BaseModel, Field, ValidationError
 
 DATABASE = os.environ.get("DATABASE_URL", "ratings.db")
 SECRET_KEY = os.environ.get("SECRET_KEY", "set-a-secret-key")
 ADMIN_PASSWORD = os.environ.get("ADMIN_PASSWORD", "MASTERCHEF2025")
+# Compared as fixed-length digests so compare_digest also accepts non-ASCII input
+ADMIN_HASH = hashlib.sha256(ADMIN_PASSWORD.encode("utf-8")).digest()
 
 # Participants (Steve added)
-ENTRANTS = ["Javier","Lindsay","Yesenia","Bryan","Viviana","Bernie","Rogelio","Daniella","Colleen","Justin","Paige","Nic","Martha","Steve"]
+ENTRANTS = ("Javier","Lindsay","Yesenia","Bryan","Viviana","Bernie","Rogelio","Daniella","Colleen","Justin","Paige","Nic","Martha","Steve")
+
+CSV_HEADER = ("id","entrant_name","taste","presentation","easy","judge","device_id","one_word","created_at")
+
+# Rows per chunk handed to the WSGI server by /export.csv
+EXPORT_BATCH_ROWS = 1000
+
+# Votes are queued and written in one transaction per burst: at most this
+# many seconds after the first queued vote, or as soon as this many pile up.
+RATE_FLUSH_INTERVAL = 0.05
+RATE_FLUSH_MAX = 100
+# A failed flush is re-queued and retried with doubling delays up to
+# RATE_FLUSH_BACKOFF_MAX seconds. "database is locked" is retried for as long
+# as it lasts; any other error drops the batch after RATE_FLUSH_RETRIES.
+RATE_FLUSH_RETRIES = 5
+RATE_FLUSH_BACKOFF_MAX = 2.0
+
+# Request-path SQL, kept as module constants so every call hands sqlite3's
+# statement cache the same string.
+SQL_UPSERT_RATING = """
+    INSERT INTO ratings (entrant_index, taste, presentation, easy, judge, device_id, one_word, one_word_norm)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(entrant_index, device_id) DO UPDATE SET
+        taste=excluded.taste,
+        presentation=excluded.presentation,
+        easy=excluded.easy,
+        judge=excluded.judge,
+        one_word=excluded.one_word,
+        one_word_norm=excluded.one_word_norm
+"""
+
+SQL_MY_RATING = "SELECT taste, presentation, easy, judge, one_word FROM ratings WHERE entrant_index=? AND device_id=?"
+
+SQL_LEADERBOARD = """
+    SELECT entrant_index, votes, sum_taste, sum_pres, sum_easy
+    FROM entrant_stats WHERE votes > 0
+    ORDER BY CAST(sum_taste + sum_pres + sum_easy AS REAL) / votes DESC
+"""
+
+SQL_WORDS = """
+    SELECT entrant_index, one_word_norm, COUNT(*) AS c
+    FROM ratings
+    WHERE one_word_norm IS NOT NULL
+    GROUP BY entrant_index, one_word_norm
+    ORDER BY entrant_index ASC, c DESC, one_word_norm ASC
+"""
+
+# id is AUTOINCREMENT and upserts never touch created_at, so rowid order is
+# creation order and needs no sort.
+SQL_EXPORT = """
+    SELECT id, entrant_index, taste, presentation, easy, judge, device_id, one_word, created_at
+    FROM ratings
+    ORDER BY id ASC
+"""
+
+SQL_ADMIN_RATINGS = """
+    SELECT r.id, r.entrant_index, r.taste, r.presentation, r.easy, r.total, r.judge, r.device_id, r.one_word, r.created_at
+    FROM ratings r
+    ORDER BY r.entrant_index ASC, r.created_at ASC
+"""
+
+SQL_ADMIN_LEADERBOARD = """
+    SELECT entrant_index, votes, CAST(sum_taste + sum_pres + sum_easy AS REAL) / votes AS avg_total
+    FROM entrant_stats WHERE votes > 0 ORDER BY avg_total DESC
+"""
 
 app = Flask(__name__, static_folder="static", template_folder="templates")
 app.secret_key = SECRET_KEY
+cache = Cache(app, config={"CACHE_TYPE": "SimpleCache"})
+
+def connect_db(isolation_level=""):
+    db = sqlite3.connect(DATABASE, check_same_thread=False, cached_statements=256, isolation_level=isolation_level)
+    db.row_factory = sqlite3.Row
+    # WAL lets leaderboard reads run alongside rating writes; NORMAL skips
+    # the per-commit fsync that WAL doesn't need for consistency.
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.execute("PRAGMA temp_store=MEMORY")
+    db.execute("PRAGMA cache_size=-20000")
+    db.execute("PRAGMA mmap_size=134217728")
+    return db
+
+def tuple_cursor(db):
+    # Plain tuples index faster than sqlite3.Row in per-row loops
+    cur = db.cursor()
+    cur.row_factory = None
+    return cur
+
+# One connection per worker thread, opened on first use and kept for the
+# thread's lifetime so pragmas and cached statements carry across requests.
+local = threading.local()
 
 def get_db():
-    db = getattr(g, "_db", None)
+    db = getattr(local, "db", None)
     if db is None:
-        db = g._db = sqlite3.connect(DATABASE, check_same_thread=False)
-        db.row_factory = sqlite3.Row
+        db = local.db = connect_db()
     return db
 
-def column_exists(db, table, col):
-    row = db.execute("PRAGMA table_info(%s)" % table).fetchall()
-    return any(r[1] == col for r in row)
+@app.teardown_appcontext
+def rollback_db(exception):
+    # The connection outlives the request, but a transaction left open by a
+    # failed write must not leak into the thread's next request.
+    db = getattr(local, "db", None)
+    if db is not None and db.in_transaction:
+        db.rollback()
+
+def sanitize_one_word(s):
+    # Returns (word as typed, lowercased form used for grouping)
+    if not s:
+        return None, None
+    s = (s or "").strip()
+    if not s:
+        return None, None
+    first = s.split()[0][:20]
+    return first, first.lower()
 
 def init_db():
-    db = get_db()
+    # Own connection, closed afterwards, so a preloading server never forks
+    # a live SQLite handle into its workers.
+    db = connect_db()
     db.execute("""
         CREATE TABLE IF NOT EXISTS ratings(
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -34,26 +141,221 @@ def init_db():
             judge TEXT,
             device_id TEXT,
             one_word TEXT,
+            one_word_norm TEXT,
             created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            total INTEGER GENERATED ALWAYS AS (taste + presentation + easy) VIRTUAL,
             UNIQUE (entrant_index, device_id)
         )
     """)
+    # Older databases predate one_word, one_word_norm and total; on current
+    # ones these fail with "duplicate column name".
     try:
-        if not column_exists(db, "ratings", "one_word"):
-            db.execute("ALTER TABLE ratings ADD COLUMN one_word TEXT")
-    except Exception:
+        db.execute("ALTER TABLE ratings ADD COLUMN one_word TEXT")
+    except sqlite3.OperationalError:
+        pass
+    try:
+        db.execute("ALTER TABLE ratings ADD COLUMN one_word_norm TEXT")
+    except sqlite3.OperationalError:
+        pass
+    try:
+        db.execute("ALTER TABLE ratings ADD COLUMN total INTEGER GENERATED ALWAYS AS (taste + presentation + easy) VIRTUAL")
+    except sqlite3.OperationalError:
         pass
+    # Backfill through sanitize_one_word so old rows group exactly like new ones
+    stale = db.execute(
+        "SELECT id, one_word FROM ratings WHERE one_word IS NOT NULL AND one_word_norm IS NULL"
+    ).fetchall()
+    db.executemany(
+        "UPDATE ratings SET one_word_norm=? WHERE id=?",
+        [(sanitize_one_word(w)[1], i) for i, w in stale],
+    )
+    # /api/my-rating is already served by the UNIQUE(entrant_index, device_id)
+    # autoindex; this one covers the /api/words aggregation.
+    db.execute("DROP INDEX IF EXISTS idx_ratings_entrant_word")
+    db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_ratings_entrant_word_norm
+        ON ratings(entrant_index, one_word_norm) WHERE one_word_norm IS NOT NULL
+    """)
+    # Per-entrant running totals kept in step with ratings by triggers, so
+    # leaderboards read at most one row per entrant instead of scanning.
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS entrant_stats(
+            entrant_index INTEGER PRIMARY KEY,
+            votes INTEGER NOT NULL DEFAULT 0,
+            sum_taste INTEGER NOT NULL DEFAULT 0,
+            sum_pres INTEGER NOT NULL DEFAULT 0,
+            sum_easy INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    db.execute("""
+        CREATE TRIGGER IF NOT EXISTS ratings_stats_insert AFTER INSERT ON ratings
+        BEGIN
+            INSERT INTO entrant_stats (entrant_index, votes, sum_taste, sum_pres, sum_easy)
+            VALUES (NEW.entrant_index, 1, NEW.taste, NEW.presentation, NEW.easy)
+            ON CONFLICT(entrant_index) DO UPDATE SET
+                votes=votes + 1,
+                sum_taste=sum_taste + excluded.sum_taste,
+                sum_pres=sum_pres + excluded.sum_pres,
+                sum_easy=sum_easy + excluded.sum_easy;
+        END
+    """)
+    db.execute("""
+        CREATE TRIGGER IF NOT EXISTS ratings_stats_update
+        AFTER UPDATE OF entrant_index, taste, presentation, easy ON ratings
+        BEGIN
+            UPDATE entrant_stats SET
+                votes=votes - 1,
+                sum_taste=sum_taste - OLD.taste,
+                sum_pres=sum_pres - OLD.presentation,
+                sum_easy=sum_easy - OLD.easy
+            WHERE entrant_index=OLD.entrant_index;
+            INSERT INTO entrant_stats (entrant_index, votes, sum_taste, sum_pres, sum_easy)
+            VALUES (NEW.entrant_index, 1, NEW.taste, NEW.presentation, NEW.easy)
+            ON CONFLICT(entrant_index) DO UPDATE SET
+                votes=votes + 1,
+                sum_taste=sum_taste + excluded.sum_taste,
+                sum_pres=sum_pres + excluded.sum_pres,
+                sum_easy=sum_easy + excluded.sum_easy;
+        END
+    """)
+    db.execute("""
+        CREATE TRIGGER IF NOT EXISTS ratings_stats_delete AFTER DELETE ON ratings
+        BEGIN
+            UPDATE entrant_stats SET
+                votes=votes - 1,
+                sum_taste=sum_taste - OLD.taste,
+                sum_pres=sum_pres - OLD.presentation,
+                sum_easy=sum_easy - OLD.easy
+            WHERE entrant_index=OLD.entrant_index;
+        END
+    """)
+    # Rebuild once at startup so databases created before the triggers
+    # existed start from correct totals.
+    db.execute("DELETE FROM entrant_stats")
+    db.execute("""
+        INSERT INTO entrant_stats (entrant_index, votes, sum_taste, sum_pres, sum_easy)
+        SELECT entrant_index, COUNT(*), SUM(taste), SUM(presentation), SUM(easy)
+        FROM ratings GROUP BY entrant_index
+    """)
     db.commit()
-
-@app.teardown_appcontext
-def close_db(exception):
-    db = getattr(g, "_db", None)
-    if db is not None:
-        db.close()
+    db.close()
 
 with app.app_context():
     init_db()
 
+def invalidate_results():
+    cache.delete("view//api/leaderboard")
+    cache.delete("view//api/words")
+
+# Write-behind queue for /api/rate, drained by flush_pending on a short
+# timer. Readers that must see every vote (admin, export) flush first.
+# pending_lock only guards the queue; the DB write happens under
+# writer_lock, so a slow or locked database never stalls /api/rate or
+# /api/my-rating. Votes being written stay visible through inflight.
+pending = collections.deque()
+pending_lock = threading.Lock()
+writer_lock = threading.Lock()
+inflight = []
+flush_timer = None
+flush_failures = 0
+flush_busy = 0
+writer_db = None
+
+def is_busy(exc):
+    # Another writer (a sibling worker's flusher, admin_reset, a startup
+    # init_db) holds the lock past the busy timeout: transient, not a bad batch.
+    return isinstance(exc, sqlite3.OperationalError) and "database is locked" in str(exc)
+
+def schedule_flush(delay):
+    # Caller holds pending_lock
+    global flush_timer
+    flush_timer = threading.Timer(delay, flush_pending)
+    flush_timer.daemon = True
+    flush_timer.start()
+
+def write_batch(batch):
+    global writer_db
+    if writer_db is None:
+        # Autocommit mode so the transaction below is exactly the one we
+        # open: IMMEDIATE takes the write lock up front, and the whole
+        # burst lands in a single COMMIT.
+        writer_db = connect_db(isolation_level=None)
+    try:
+        writer_db.execute("BEGIN IMMEDIATE")
+        writer_db.executemany(SQL_UPSERT_RATING, batch)
+        writer_db.execute("COMMIT")
+    except Exception:
+        if writer_db.in_transaction:
+            writer_db.execute("ROLLBACK")
+        raise
+
+def flush_pending():
+    global flush_timer, flush_failures, flush_busy
+    # writer_lock is taken first so batches commit in the order they were
+    # queued and an older vote can never overwrite a newer one.
+    with writer_lock:
+        with pending_lock:
+            if flush_timer is not None:
+                flush_timer.cancel()
+                flush_timer = None
+            if not pending:
+                return
+            batch = list(pending)
+            pending.clear()
+            inflight[:] = batch
+        try:
+            write_batch(batch)
+        except Exception as e:
+            with pending_lock:
+                inflight.clear()
+                if is_busy(e):
+                    # Lock contention never counts toward dropping the batch
+                    flush_busy += 1
+                    app.logger.warning("Database locked, re-queued %d ratings", len(batch))
+                    pending.extendleft(reversed(batch))
+                    if flush_timer is None:
+                        schedule_flush(min(RATE_FLUSH_INTERVAL * 2 ** flush_busy, RATE_FLUSH_BACKOFF_MAX))
+                    return
+                flush_failures += 1
+                if flush_failures > RATE_FLUSH_RETRIES:
+                    # Bounded so a batch that can never be written doesn't
+                    # retry forever and hold back every later vote.
+                    app.logger.exception("Dropped %d queued ratings after %d attempts", len(batch), flush_failures)
+                    flush_failures = 0
+                else:
+                    app.logger.warning("Flush of %d queued ratings failed (attempt %d), retrying", len(batch), flush_failures, exc_info=True)
+                    pending.extendleft(reversed(batch))
+                if pending and flush_timer is None:
+                    schedule_flush(min(RATE_FLUSH_INTERVAL * 2 ** flush_failures, RATE_FLUSH_BACKOFF_MAX))
+            return
+        with pending_lock:
+            inflight.clear()
+            flush_failures = 0
+            flush_busy = 0
+    invalidate_results()
+
+def queue_rating(params):
+    with pending_lock:
+        pending.append(params)
+        if len(pending) < RATE_FLUSH_MAX:
+            if flush_timer is None:
+                schedule_flush(RATE_FLUSH_INTERVAL)
+            return
+    # A full queue flushes inline, which doubles as backpressure on callers
+    flush_pending()
+
+def pending_rating(entrant_index, device_id):
+    with pending_lock:
+        for p in reversed(pending):
+            if p[0] == entrant_index and p[5] == device_id:
+                return p
+        for p in reversed(inflight):
+            if p[0] == entrant_index and p[5] == device_id:
+                return p
+    return None
+
+atexit.register(flush_pending)
+
 def device_id_from_request():
     return request.cookies.get("device_id") or "anon"
 
@@ -68,50 +370,37 @@ def home():
 def words_page():
     return render_template("words.html", entrants=ENTRANTS, title="One Word Results")
 
-def sanitize_one_word(s):
-    if not s:
-        return None
-    s = (s or "").strip()
-    if not s:
-        return None
-    first = s.split()[0][:20]
-    return first
+class RateIn(BaseModel):
+    entrant_index: int = Field(ge=0, lt=len(ENTRANTS))
+    taste: int = Field(ge=1, le=5)
+    presentation: int = Field(ge=1, le=5)
+    easy: int = Field(ge=1, le=5)
+    judge: Optional[str] = None
+    one_word: Optional[str] = None
+
+RANGE_ERRORS = {"greater_than_equal", "less_than_equal", "less_than"}
+
+def rate_error(exc):
+    # Keep the old precedence: malformed fields first, then entrant, then scores
+    errors = exc.errors()
+    if any(e["type"] not in RANGE_ERRORS for e in errors):
+        return "Invalid payload"
+    if any(e["loc"] == ("entrant_index",) for e in errors):
+        return "Invalid entrant"
+    return "Scores must be 1 to 5"
 
 @app.route("/api/rate", methods=["POST"])
 def api_rate():
-    data = request.get_json(silent=True) or {}
     try:
-        entrant_index = int(data.get("entrant_index"))
-        taste = int(data.get("taste"))
-        presentation = int(data.get("presentation"))
-        easy = int(data.get("easy"))
-        judge = (data.get("judge") or "").strip()[:50] or None
-        one_word = sanitize_one_word(data.get("one_word"))
-    except Exception:
-        return jsonify({"ok": False, "error": "Invalid payload"}), 400
-
-    if not (0 <= entrant_index < len(ENTRANTS)):
-        return jsonify({"ok": False, "error": "Invalid entrant"}), 400
-    for v in (taste, presentation, easy):
-        if v < 1 or v > 5:
-            return jsonify({"ok": False, "error": "Scores must be 1 to 5"}), 400
+        data = RateIn.model_validate_json(request.get_data())
+    except ValidationError as e:
+        return jsonify({"ok": False, "error": rate_error(e)}), 400
+    entrant_index, taste, presentation, easy = data.entrant_index, data.taste, data.presentation, data.easy
+    judge = (data.judge or "").strip()[:50] or None
+    one_word, one_word_norm = sanitize_one_word(data.one_word)
 
     device_id = device_id_from_request()
-    db = get_db()
-    db.execute(
-        """
-        INSERT INTO ratings (entrant_index, taste, presentation, easy, judge, device_id, one_word)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-        ON CONFLICT(entrant_index, device_id) DO UPDATE SET
-            taste=excluded.taste,
-            presentation=excluded.presentation,
-            easy=excluded.easy,
-            judge=excluded.judge,
-            one_word=excluded.one_word
-        """,
-        (entrant_index, taste, presentation, easy, judge, device_id, one_word),
-    )
-    db.commit()
+    queue_rating((entrant_index, taste, presentation, easy, judge, device_id, one_word, one_word_norm))
     return jsonify({"ok": True})
 
 @app.route("/api/my-rating")
@@ -124,121 +413,136 @@ def api_my_rating():
         return jsonify({"ok": True, "rating": None})
 
     device_id = device_id_from_request()
+    queued = pending_rating(entrant_index, device_id)
+    if queued:
+        _, taste, presentation, easy, judge, _, one_word, _ = queued
+        return jsonify({"ok": True, "rating": {
+            "taste": taste, "presentation": presentation, "easy": easy, "judge": judge, "one_word": one_word,
+        }})
     db = get_db()
-    row = db.execute(
-        "SELECT taste, presentation, easy, judge, one_word FROM ratings WHERE entrant_index=? AND device_id=?",
-        (entrant_index, device_id),
-    ).fetchone()
+    row = db.execute(SQL_MY_RATING, (entrant_index, device_id)).fetchone()
     return jsonify({"ok": True, "rating": dict(row) if row else None})
 
 @app.route("/api/leaderboard")
+@cache.cached(timeout=5)
 def api_leaderboard():
     db = get_db()
-    rows = db.execute("""
-        SELECT entrant_index,
-               COUNT(*) AS votes,
-               AVG(taste) AS avg_taste,
-               AVG(presentation) AS avg_presentation,
-               AVG(easy) AS avg_easy,
-               AVG(taste + presentation + easy) AS avg_total
-        FROM ratings
-        GROUP BY entrant_index
-        ORDER BY avg_total DESC
-    """).fetchall()
+    entrants = ENTRANTS
     out = [{
-        "name": ENTRANTS[r["entrant_index"]],
-        "votes": r["votes"],
-        "avg_taste": round(r["avg_taste"] or 0, 2),
-        "avg_presentation": round(r["avg_presentation"] or 0, 2),
-        "avg_easy": round(r["avg_easy"] or 0, 2),
-        "avg_total": round(r["avg_total"] or 0, 2),
-    } for r in rows]
+        "name": entrants[entrant_index],
+        "votes": n,
+        "avg_taste": round(taste / n, 2),
+        "avg_presentation": round(presentation / n, 2),
+        "avg_easy": round(easy / n, 2),
+        "avg_total": round((taste + presentation + easy) / n, 2),
+    } for entrant_index, n, taste, presentation, easy in tuple_cursor(db).execute(SQL_LEADERBOARD)]
     return jsonify(out)
 
 @app.route("/api/words")
+@cache.cached(timeout=10)
 def api_words():
     db = get_db()
-    rows = db.execute("""
-        SELECT entrant_index, LOWER(TRIM(one_word)) AS w, COUNT(*) AS c
-        FROM ratings
-        WHERE one_word IS NOT NULL AND TRIM(one_word) != ''
-        GROUP BY entrant_index, LOWER(TRIM(one_word))
-        ORDER BY entrant_index ASC, c DESC, w ASC
-    """).fetchall()
+    rows = tuple_cursor(db).execute(SQL_WORDS).fetchall()
+    entrants = ENTRANTS
     out = {}
-    for r in rows:
-        name = ENTRANTS[r["entrant_index"]]
-        out.setdefault(name, []).append({"word": r["w"], "count": r["c"]})
+    for entrant_index, w, c in rows:
+        out.setdefault(entrants[entrant_index], []).append({"word": w, "count": c})
     return jsonify(out)
 
+def gzip_stream(chunks):
+    out = io.BytesIO()
+    try:
+        with gzip.GzipFile(fileobj=out, mode="wb") as gz:
+            for chunk in chunks:
+                gz.write(chunk)
+                if out.tell():
+                    yield out.getvalue()
+                    out.seek(0)
+                    out.truncate(0)
+        yield out.getvalue()
+    finally:
+        chunks.close()
+
 @app.route("/export.csv")
 def export_csv():
-    db = get_db()
-    rows = db.execute("""
-        SELECT id, entrant_index, taste, presentation, easy, judge, device_id, one_word, created_at
-        FROM ratings
-        ORDER BY created_at ASC
-    """).fetchall()
+    flush_pending()
+    # The thread's connection outlives the request, so the cursor can be
+    # drained after the view returns. Chunks are encoded here because
+    # direct_passthrough skips Response's encoding.
+    cur = tuple_cursor(get_db()).execute(SQL_EXPORT)
 
     def generate():
-        header = ["id","entrant_name","taste","presentation","easy","judge","device_id","one_word","created_at"]
-        yield ",".join(header) + "\\n"
-        for r in rows:
-            name = ENTRANTS[r["entrant_index"]]
-            def q(s): 
-                s = "" if s is None else str(s)
-                return '"' + s.replace('"','""') + '"'
-            line = [
-                str(r["id"]), q(name), str(r["taste"]), str(r["presentation"]), str(r["easy"]),
-                q(r["judge"] or ""), q(r["device_id"] or ""), q(r["one_word"] or ""), str(r["created_at"])
-            ]
-            yield ",".join(line) + "\\n"
-    return Response(generate(), mimetype="text/csv")
+        entrants = ENTRANTS
+        buf = io.StringIO()
+        writer = csv.writer(buf, lineterminator="\n")
+        try:
+            writer.writerow(CSV_HEADER)
+            n = 0
+            for r in cur:
+                row = list(r)
+                row[1] = entrants[row[1]]
+                writer.writerow(row)
+                n += 1
+                if n >= EXPORT_BATCH_ROWS:
+                    yield buf.getvalue().encode("utf-8")
+                    buf.seek(0)
+                    buf.truncate(0)
+                    n = 0
+            if buf.tell():
+                yield buf.getvalue().encode("utf-8")
+        finally:
+            cur.close()
+    if request.accept_encodings["gzip"] > 0:
+        resp = Response(gzip_stream(generate()), mimetype="text/csv", direct_passthrough=True)
+        resp.headers["Content-Encoding"] = "gzip"
+    else:
+        resp = Response(generate(), mimetype="text/csv", direct_passthrough=True)
+    resp.headers["Content-Disposition"] = "attachment; filename=ratings.csv"
+    resp.vary.add("Accept-Encoding")
+    return resp
 
 @app.route("/admin", methods=["GET", "POST"])
 def admin():
     if request.method == "POST":
         pw = (request.form.get("password") or "").strip()
-        if pw == ADMIN_PASSWORD:
+        if hmac.compare_digest(hashlib.sha256(pw.encode("utf-8")).digest(), ADMIN_HASH):
             session["is_admin"] = True
             return redirect(url_for("admin"))
         return render_template("admin_login.html", error="Incorrect password")
     if not session.get("is_admin"):
         return render_template("admin_login.html")
 
+    flush_pending()
     db = get_db()
-    rows = db.execute("""
-        SELECT r.id, r.entrant_index, r.taste, r.presentation, r.easy, r.judge, r.device_id, r.one_word, r.created_at
-        FROM ratings r
-        ORDER BY r.entrant_index ASC, r.created_at ASC
-    """).fetchall()
-    detailed = [{
-        "id": r["id"],
-        "entrant": ENTRANTS[r["entrant_index"]],
-        "taste": r["taste"],
-        "presentation": r["presentation"],
-        "easy": r["easy"],
-        "total": r["taste"] + r["presentation"] + r["easy"],
-        "judge": r["judge"] or "",
-        "device_id": r["device_id"] or "",
-        "one_word": r["one_word"] or "",
-        "created_at": r["created_at"],
-    } for r in rows]
-    lb = db.execute("""
-        SELECT entrant_index, COUNT(*) AS votes, AVG(taste + presentation + easy) AS avg_total
-        FROM ratings GROUP BY entrant_index ORDER BY avg_total DESC
-    """).fetchall()
-    lb_data = [{"name": ENTRANTS[r["entrant_index"]], "votes": r["votes"], "avg_total": round(r["avg_total"] or 0, 2)} for r in lb]
+    entrants = ENTRANTS
+    # Generator over a live cursor: rows are read as the template streams
+    # them out rather than collected into a list first.
+    detailed = ({
+        "id": r[0],
+        "entrant": entrants[r[1]],
+        "taste": r[2],
+        "presentation": r[3],
+        "easy": r[4],
+        "total": r[5],
+        "judge": r[6] or "",
+        "device_id": r[7] or "",
+        "one_word": r[8] or "",
+        "created_at": r[9],
+    } for r in tuple_cursor(db).execute(SQL_ADMIN_RATINGS))
+    lb = tuple_cursor(db).execute(SQL_ADMIN_LEADERBOARD).fetchall()
+    lb_data = [{"name": entrants[r[0]], "votes": r[1], "avg_total": round(r[2] or 0, 2)} for r in lb]
     reset_ok = request.args.get("reset") == "1"
-    return render_template("admin_results.html", detailed=detailed, leaderboard=lb_data, title="Admin Detailed Results", reset_ok=reset_ok)
+    return stream_template("admin_results.html", detailed=detailed, leaderboard=lb_data, title="Admin Detailed Results", reset_ok=reset_ok)
 
 @app.route("/admin/reset", methods=["POST"])
 def admin_reset():
     if not session.get("is_admin"):
         return redirect(url_for("admin"))
+    flush_pending()
     db = get_db()
     db.execute("DELETE FROM ratings")
     db.commit()
+    invalidate_results()
     return redirect(url_for("admin", reset="1"))
 
 @app.route("/admin/logout")